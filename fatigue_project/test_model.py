@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model
+from model import (
+    TOD_MAP, predict_status, predict_status_batch,
+    weighted_fatigue_score, weighted_fatigue_score_vec
+)
+
+
+def _random_drivers(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        'Sleep_Hours': float(rng.uniform(3, 12)),
+        'Driving_Hours': float(rng.uniform(0, 16)),
+        'Caffeine_Cups': float(rng.uniform(0, 5)),
+        'Rest_Breaks': float(rng.uniform(0, 60)),
+        'Age': int(rng.integers(18, 70)),
+        'Stress_Level': int(rng.integers(1, 11)),
+        'Time_of_Day': ('Morning', 'Afternoon', 'Night')[i % 3]
+    } for i in range(n)]
+
+
+@pytest.fixture(scope='module')
+def forest(tmp_path_factory):
+    mp = pytest.MonkeyPatch()
+    mp.setattr(model, 'MODEL_DIR', tmp_path_factory.mktemp('models'))
+    try:
+        yield model.train_model()
+    finally:
+        mp.undo()
+
+
+def test_vectorized_score_matches_scalar():
+    drivers = _random_drivers(200)
+    expected = [weighted_fatigue_score(d) for d in drivers]
+    np.testing.assert_allclose(weighted_fatigue_score_vec(pd.DataFrame(drivers)), expected)
+
+
+@pytest.mark.parametrize('mode', ['rule', 'forest'])
+def test_batch_matches_single_row(mode, request):
+    fitted = (None, None, TOD_MAP) if mode == 'rule' else request.getfixturevalue('forest')
+    drivers = _random_drivers()
+
+    batch = predict_status_batch(*fitted, drivers)
+    single = [predict_status(*fitted, d) for d in drivers]
+
+    assert [b[0] for b in batch] == [s[0] for s in single]
+    np.testing.assert_allclose([b[1] for b in batch], [s[1] for s in single])
+    np.testing.assert_allclose([b[2] for b in batch], [s[2] for s in single])
@@ -1,39 +1,50 @@
 # utils.py
+import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
+import streamlit as st
 
 # -----------------------------
 # Risk Color and Level Helpers
 # -----------------------------
+RISK_THRESHOLDS = (3, 5)
+
+_COLORS = (
+    "#10b981",  # Green - Safe
+    "#f59e0b",  # Orange - Moderate
+    "#ef4444",  # Red - High
+)
+_LEVELS = ("Low Risk", "Moderate Risk", "High Risk")
+_MSGS = (
+    ("✅ SAFE: Driver can continue driving. Maintain standard vigilance. "
+     "Encourage brief breaks every 2–3 hours."),
+    ("⚠️ CAUTION: Moderate risk — recommend a SHORT rest (15–30 min) and reassess. "
+     "Avoid long or monotonous driving until score improves."),
+    ("🚫 DANGER: High risk — DO NOT DRIVE. Take a sustained rest (1–2 hours) "
+     "or seek replacement before resuming."),
+)
+
+def risk_bucket(score: float) -> int:
+    """Return 0 (low), 1 (moderate) or 2 (high) for a fatigue score."""
+    low, high = RISK_THRESHOLDS
+    return 0 if score < low else (1 if score < high else 2)
+
 def get_risk_color(score: float) -> str:
     """Return color based on fatigue score."""
-    if score < 3:
-        return "#10b981"  # Green - Safe
-    elif score < 5:
-        return "#f59e0b"  # Orange - Moderate
-    else:
-        return "#ef4444"  # Red - High
+    return _COLORS[risk_bucket(score)]
 
 def get_risk_level(score: float) -> str:
     """Return text risk level based on score."""
-    if score < 3:
-        return "Low Risk"
-    elif score < 5:
-        return "Moderate Risk"
-    else:
-        return "High Risk"
+    return _LEVELS[risk_bucket(score)]
 
 def get_action_message(score: float) -> str:
     """Return safety action message based on fatigue score."""
-    if score < 3:
-        return ("✅ SAFE: Driver can continue driving. Maintain standard vigilance. "
-                "Encourage brief breaks every 2–3 hours.")
-    elif score < 5:
-        return ("⚠️ CAUTION: Moderate risk — recommend a SHORT rest (15–30 min) and reassess. "
-                "Avoid long or monotonous driving until score improves.")
-    else:
-        return ("🚫 DANGER: High risk — DO NOT DRIVE. Take a sustained rest (1–2 hours) "
-                "or seek replacement before resuming.")
+    return _MSGS[risk_bucket(score)]
+
+def get_risk_levels(scores) -> pd.Categorical:
+    """Return the risk level for every score in an array, ordered Low to High."""
+    return pd.Categorical.from_codes(np.digitize(scores, RISK_THRESHOLDS), categories=_LEVELS,
+                                      ordered=True)
 
 # -----------------------------
 # Visualization Helpers
@@ -103,20 +114,42 @@ def create_feature_radar(input_data: dict):
     return fig
 
 
-def create_timeline_chart(records: pd.DataFrame):
-    """Create timeline chart of fatigue scores."""
+def create_timeline_chart(records: pd.DataFrame, revision, max_points: int = 500):
+    """Create timeline chart of fatigue scores, plotting at most max_points points.
+
+    The figure is cached across Streamlit reruns and sessions, so revision must
+    be a hashable value unique to this session's current records (e.g. a
+    per-session token plus a change counter); the row count and last timestamp
+    are part of the cache key as well.
+    """
     if records.empty:
         return None
 
-    records['Timestamp_dt'] = pd.to_datetime(records['Timestamp'])
-    records = records.sort_values('Timestamp_dt')
+    key = (revision, len(records), records['Timestamp'].iloc[-1])
+    return _build_timeline(records, key, max_points)
+
+
+# The leading underscore keeps st.cache_data from hashing the records frame;
+# the cheap key stands in for it.
+@st.cache_data(show_spinner=False, max_entries=32)
+def _build_timeline(_records: pd.DataFrame, key: tuple, max_points: int):
+    ts = _records['Timestamp'].to_numpy()
+    names = _records['Name'].to_numpy()
+    scores = _records['Fatigue_Score'].to_numpy()
+    preds = _records['Prediction'].to_numpy()
+    order = np.argsort(ts, kind='stable')
+    if len(order) > max_points:
+        # Evenly strided sample: keeps the first and last points and
+        # bounds the figure payload sent to the browser.
+        order = order[np.linspace(0, len(order) - 1, max_points).astype(int)]
+    ts, names, scores, preds = ts[order], names[order], scores[order], preds[order]
 
     fig = go.Figure()
     for status in ['Alert', 'Fatigued']:
-        df_status = records[records['Prediction'] == status]
+        mask = preds == status
         fig.add_trace(go.Scatter(
-            x=df_status['Timestamp_dt'],
-            y=df_status['Fatigue_Score'],
+            x=ts[mask],
+            y=scores[mask],
             mode='markers+lines',
             name=status,
             marker=dict(
@@ -126,7 +159,7 @@ def create_timeline_chart(records: pd.DataFrame):
             ),
             line=dict(width=2),
             hovertemplate='<b>%{text}</b><br>Score: %{y:.2f}<br>%{x}<extra></extra>',
-            text=df_status['Name']
+            text=names[mask]
         ))
     fig.update_layout(
         title='Fatigue Score Timeline',